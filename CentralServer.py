@@ -1,7 +1,7 @@
 import socketio
 import json
 import uvicorn
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import settings
@@ -9,9 +9,18 @@ import cv2
 import numpy as np
 import asyncio
 import time
+import itertools
+import secrets
 from pynput import mouse, keyboard
 import screeninfo
 from typing import Dict
+from video_stream import CODECS, FALLBACK, VideoStream, codec_available
+from renditions import RENDITIONS, RenditionCache, pack_grid_tile
+from binary_protocol import pack_hello, pack_input, unpack_frame, unpack_input
+from session_recorder import SessionPlayback, SessionRecorder, list_sessions
+from admission import AdmissionController
+from data_access import DB_NAME, ClientUuidStore
+from traffic_stats import TrafficStats
  
 # FastAPI app setup
 app = FastAPI()
@@ -36,19 +45,47 @@ socket_app = socketio.ASGIApp(sio, other_asgi_app=app)
  
 # MongoDB setup
 MONGO_URI = settings.mongo_uri
-DB_NAME = "EbantisV3"
-COLLECTION_NAME = "Client_uuid"
 client = AsyncIOMotorClient(MONGO_URI)
 db = client[DB_NAME]
-collection = db[COLLECTION_NAME]
+client_uuid_store = ClientUuidStore(db)
+ 
+# Admission control - smooths reconnect storms after a server restart
+CONNECT_RATE = 20  # New connections admitted per second
+CONNECT_BURST = 50
+FRAME_RATE = 600  # Frames per second across sessions nobody is watching
+FRAME_BURST = 1200
+DB_WRITE_CONCURRENCY = 10  # Concurrent disconnect status writes to MongoDB
+admission = AdmissionController(CONNECT_RATE, CONNECT_BURST, FRAME_RATE, FRAME_BURST)
+db_write_limit = asyncio.Semaphore(DB_WRITE_CONCURRENCY)
+WATCHED_SESSION_TTL = 300  # Seconds a watched session keeps priority after an unexpected disconnect/restart
+INDEX_RETRY_SECONDS = 30  # Delay between attempts to verify MongoDB indexes at startup
+ 
+def has_priority(uuid: str) -> bool:
+    """Sessions a supervisor is watching, including ones that just dropped and are reconnecting"""
+    return active_sessions.get(uuid) == True or watched_sessions.get(uuid, 0) > time.time()
+ 
+# Session recording (optional) - set `recording_dir` in config to enable
+RECORDING_DIR = getattr(settings, "recording_dir", None)
+recorder = SessionRecorder(RECORDING_DIR) if RECORDING_DIR else None
  
 # Globals
 clients = set()
 frame_queues: Dict[str, asyncio.Queue] = {}
 latest_frames: Dict[str, np.ndarray] = {}
+frame_seq: Dict[str, int] = {}  # Bumped on every new frame in latest_frames
+rendition_cache = RenditionCache()
+traffic_stats = TrafficStats()  # Rolling per-UUID fps/bytes/drops, freed on disconnect
 uuid_sid_map: Dict[str, str] = {}
 active_sessions: Dict[str, bool] = {}  # Track intentional sessions
+watched_sessions: Dict[str, float] = {}  # uuid -> time until which a dropped session keeps admission priority
 last_heartbeat: Dict[str, float] = {}  # Track last heartbeat time
+video_streams: Dict[str, Dict[str, VideoStream]] = {}  # uuid -> codec -> shared encoder
+binary_sids = set()  # Clients that connected with ?proto=bin
+stream_ids: Dict[str, int] = {}  # uuid -> binary stream id
+stream_uuids: Dict[int, str] = {}  # binary stream id -> uuid
+stream_id_counter = itertools.count(1)
+viewer_id_counter = itertools.count(1)  # Stable, never-reused ids for per-viewer stats
+ingest_tokens: Dict[str, str] = {}  # uuid -> token required by /ws/ingest, handed out via open_stream
  
 # Get screen size
 def get_client_screen_size():
@@ -68,7 +105,14 @@ def send_input_sync(event_data):
     asyncio.run_coroutine_threadsafe(send_input(event_data), loop)
  
 async def send_input(event_data):
-    for sid in clients:
+    for sid in list(clients):
+        await emit_input(sid, event_data)
+ 
+async def emit_input(sid, event_data):
+    """Send an input event in the format the client negotiated at connect"""
+    if sid in binary_sids:
+        await sio.emit('input_bin', pack_input(event_data), to=sid)
+    else:
         await sio.emit('input_event', event_data, to=sid)
  
 # Mouse and keyboard listeners
@@ -115,16 +159,31 @@ keyboard_listener.start()
 # Socket.IO events
 @sio.event
 def connect(sid, environ, auth):
+    query = environ.get("QUERY_STRING", "")
+    from urllib.parse import parse_qs
+    params = parse_qs(query)
+    uuid = params.get("uuid", [None])[0]
+   
+    # Sessions being watched reconnect first; everyone else waits for a token
+    priority = has_priority(str(uuid))
+    admitted, retry_after = admission.admit_connect(priority=priority)
+    if not admitted:
+        print(f"[CONNECT] Refused {sid} (UUID {uuid}), suggested retry in {retry_after}s")
+        raise socketio.exceptions.ConnectionRefusedError("server busy", {"retry_after": retry_after})
+   
     print(f"[CONNECT] Client connected: {sid}")
     clients.add(sid)
    
-    query = environ.get("QUERY_STRING", "")
-    from urllib.parse import parse_qs
-    uuid = parse_qs(query).get("uuid", [None])[0]
+    if params.get("proto", [None])[0] == "bin":
+        binary_sids.add(sid)
    
     if uuid:
         uuid_sid_map[uuid] = sid
         last_heartbeat[uuid] = time.time()
+        # A watched session that dropped (or survived a server restart) resumes as active
+        if priority and watched_sessions.pop(uuid, None) is not None:
+            active_sessions[uuid] = True
+            print(f"[CONNECT] Resumed watched session for UUID {uuid}")
         print(f"[CONNECT] Registered UUID {uuid} with SID {sid}")
         print(f"[CONNECT] UUID map: {uuid_sid_map}")
    
@@ -134,6 +193,7 @@ def connect(sid, environ, auth):
 async def disconnect(sid):
     print(f"[DISCONNECT] Client disconnected: {sid}")
     clients.discard(sid)
+    binary_sids.discard(sid)
    
     # Find the UUID for this SID
     uuid_to_remove = None
@@ -155,13 +215,17 @@ async def disconnect(sid):
     else:
         print(f"[DISCONNECT] ⚠️ UNEXPECTED disconnect for UUID {uuid_to_remove}")
         status = "Disconnected"
+        # Keep admission priority so the session isn't starved while it reconnects
+        if active_sessions.get(str(uuid_to_remove)) == True:
+            watched_sessions[str(uuid_to_remove)] = time.time() + WATCHED_SESSION_TTL
    
-    # Update database
+    # Update database (bounded, so a mass disconnect doesn't flood MongoDB)
     try:
-        await collection.update_one(
-            {"uuid": uuid_to_remove},
-            {"$set": {"Status": status, "connection": False}}
-        )
+        async with db_write_limit:
+            await client_uuid_store.update_by_uuid(
+                uuid_to_remove,
+                {"Status": status, "connection": False}
+            )
         print(f"[DISCONNECT] Updated DB: UUID {uuid_to_remove} set to {status}")
     except Exception as e:
         print(f"[DISCONNECT] Error updating DB for UUID {uuid_to_remove}: {e}")
@@ -170,11 +234,22 @@ async def disconnect(sid):
     uuid_sid_map.pop(uuid_to_remove, None)
     active_sessions.pop(str(uuid_to_remove), None)
     last_heartbeat.pop(uuid_to_remove, None)
-    latest_frames.pop(str(uuid_to_remove), None)
-    frame_queues.pop(str(uuid_to_remove), None)
+    release_stream_state(str(uuid_to_remove))
+    stream_uuids.pop(stream_ids.pop(str(uuid_to_remove), None), None)
+    ingest_tokens.pop(str(uuid_to_remove), None)
    
     print(f"[DISCONNECT] Cleaned up resources for UUID {uuid_to_remove}")
  
+def release_stream_state(uuid: str):
+    """Free everything held for a UUID's frame stream (shared by Socket.IO and raw ingest)"""
+    latest_frames.pop(uuid, None)
+    frame_seq.pop(uuid, None)
+    if recorder:
+        recorder.close_session(uuid)
+    rendition_cache.discard(uuid)
+    traffic_stats.discard(uuid)
+    frame_queues.pop(uuid, None)
+ 
 @sio.on('heartbeat')
 async def handle_heartbeat(sid, data):
     """Handle heartbeat from client to keep connection alive"""
@@ -188,17 +263,60 @@ async def register_uuid(sid, data):
     uuid = data.get("uuid")
     print(f"[REGISTER] Received UUID registration: {uuid}")
  
+def assign_stream_id(uuid: str) -> int:
+    stream_id = stream_ids.get(uuid)
+    if stream_id is None:
+        stream_id = next(stream_id_counter) & 0xFFFFFFFF
+        stream_ids[uuid] = stream_id
+        stream_uuids[stream_id] = uuid
+    return stream_id
+ 
+@sio.on('open_stream')
+async def open_stream(sid, data):
+    """Ack with the stream id a binary client must put in its frame headers"""
+    uuid = str(data.get("uuid"))
+    if uuid_sid_map.get(uuid) != sid:
+        print(f"[FRAME] open_stream for UUID {uuid} from unregistered SID {sid}")
+        return {"error": "uuid not registered for this connection"}
+    token = ingest_tokens.setdefault(uuid, secrets.token_urlsafe(16))
+    return {"stream_id": assign_stream_id(uuid), "token": token}
+ 
 @sio.on("frame")
 async def receive_frame(sid, data):
-    uuid = str(data.get("uuid"))
-    frame_data = data.get("frame")
+    if isinstance(data, (bytes, bytearray)):
+        # Binary client: fixed header + JPEG bytes, no dict to unpack
+        try:
+            stream_id, _, _, frame_data = unpack_frame(data)
+        except ValueError as e:
+            print(f"[FRAME] Invalid binary frame from SID {sid}: {e}")
+            return
+        uuid = stream_uuids.get(stream_id)
+        if uuid is None or uuid_sid_map.get(uuid) != sid:
+            print(f"[FRAME] Unknown stream id {stream_id} from SID {sid}")
+            return
+    else:
+        uuid = str(data.get("uuid"))
+        frame_data = data.get("frame")
    
     if not uuid or not frame_data:
         print("[FRAME] Missing frame or UUID from client")
         return
    
+    await enqueue_frame(uuid, frame_data)
+ 
+async def enqueue_frame(uuid: str, frame_data):
     # Update last heartbeat time when receiving frames
     last_heartbeat[uuid] = time.time()
+    traffic_stats.frame_in(uuid, len(frame_data))
+   
+    # Tee the encoded frame to the recorder before any live-path dropping
+    if recorder:
+        recorder.tee(uuid, frame_data)
+   
+    # During a reconnect storm, frames from unwatched sessions share a global live budget
+    if not admission.admit_frame(priority=has_priority(uuid)):
+        traffic_stats.frame_dropped(uuid)
+        return
    
     if uuid not in frame_queues:
         frame_queues[uuid] = asyncio.Queue(maxsize=10)
@@ -207,6 +325,7 @@ async def receive_frame(sid, data):
         # Drop oldest frame instead of newest
         try:
             await frame_queues[uuid].get()
+            traffic_stats.frame_dropped(uuid)
         except:
             pass
    
@@ -228,11 +347,15 @@ async def process_frames():
                    
                     if frame_image is not None:
                         latest_frames[uuid] = frame_image
+                        frame_seq[uuid] = frame_seq.get(uuid, 0) + 1
+                        for stream in list(video_streams.get(uuid, {}).values()):
+                            stream.notify_frame()
                         # Only log occasionally to reduce spam
                         if int(time.time()) % 5 == 0:
                             print(f"[PROCESSOR] Stored frame for UUID: {uuid}")
                     else:
                         print(f"[PROCESSOR] Failed to decode frame for UUID: {uuid}")
+                        traffic_stats.frame_dropped(uuid)
                 except Exception as e:
                     print(f"[PROCESSOR] Error decoding frame for UUID {uuid}: {e}")
        
@@ -245,7 +368,16 @@ async def monitor_connections():
     while True:
         await asyncio.sleep(30)  # Check every 30 seconds
        
+        # During a reconnect storm heartbeats lag behind; don't kill sessions for it
+        under_pressure = admission.under_pressure()
+        if under_pressure:
+            print("[MONITOR] Admission control is throttling, skipping stale-connection cleanup")
+       
         current_time = time.time()
+        for uuid, until in list(watched_sessions.items()):
+            if until <= current_time:
+                watched_sessions.pop(uuid, None)
+       
         for uuid, last_beat in list(last_heartbeat.items()):
             time_since_heartbeat = current_time - last_beat
            
@@ -254,45 +386,142 @@ async def monitor_connections():
                 print(f"[MONITOR] ⚠️ No heartbeat from UUID {uuid} for {time_since_heartbeat:.1f}s")
            
             # Consider connection dead after 90 seconds
-            if time_since_heartbeat > 90:
+            if time_since_heartbeat > 90 and not under_pressure:
                 print(f"[MONITOR] ⚠️ UUID {uuid} appears dead, cleaning up")
                 sid = uuid_sid_map.get(uuid)
                 if sid:
                     await sio.disconnect(sid)
  
+async def load_watched_sessions():
+    """Sessions still marked Running were being watched when the server went down;
+    give them priority through the reconnect storm"""
+    try:
+        running = await client_uuid_store.find_uuids_by_status("Running")
+        until = time.time() + WATCHED_SESSION_TTL
+        for uuid in map(str, running):
+            if uuid in uuid_sid_map:
+                # Reconnected before the list finished loading: resume it right away
+                active_sessions[uuid] = True
+            else:
+                watched_sessions.setdefault(uuid, until)
+        print(f"[STARTUP] {len(running)} running session(s) will be prioritised on reconnect")
+    except Exception as e:
+        print(f"[STARTUP] Could not load running sessions: {e}")
+ 
+async def verify_indexes():
+    """Create/verify the MongoDB indexes, retrying in the background until it succeeds"""
+    while True:
+        try:
+            await client_uuid_store.ensure_indexes()
+            return
+        except Exception as e:
+            print(f"[STARTUP] Could not verify MongoDB indexes, retrying in {INDEX_RETRY_SECONDS}s: {e}")
+        await asyncio.sleep(INDEX_RETRY_SECONDS)
+ 
+async def warm_up_codecs():
+    """Probe each inter-frame codec once so the first viewer doesn't pay for it"""
+    for codec in CODECS:
+        await asyncio.to_thread(codec_available, codec)
+ 
 @app.on_event("startup")
 async def startup_event():
     print("[STARTUP] Starting background tasks...")
+    asyncio.create_task(verify_indexes())
+    asyncio.create_task(warm_up_codecs())
     asyncio.create_task(process_frames())
     asyncio.create_task(monitor_connections())
+    asyncio.create_task(load_watched_sessions())
     print("[STARTUP] All background tasks started")
  
+@app.on_event("shutdown")
+async def shutdown_event():
+    if recorder:
+        # Flush queued frames and close every recording before the process exits
+        await asyncio.to_thread(recorder.close)
+ 
+async def receive_input(websocket: WebSocket):
+    """Receive one viewer message: text (JSON) or bytes (binary input record)"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return message["bytes"]
+    return message.get("text")
+ 
+async def forward_input(uuid: str, msg):
+    """Forward a viewer's input event to the desktop client owning `uuid`"""
+    try:
+        if isinstance(msg, (bytes, bytearray)):
+            input_data = unpack_input(msg)
+        else:
+            input_data = json.loads(msg)
+        if input_data.get("type") in ["mouse_move", "mouse_click", "keyboard"]:
+            sid = uuid_sid_map.get(uuid)
+            if sid:
+                await emit_input(sid, input_data)
+            else:
+                print(f"[WEBSOCKET] No SID found for UUID {uuid}")
+    except json.JSONDecodeError:
+        print("[WEBSOCKET] Invalid JSON input from WebSocket")
+    except ValueError as e:
+        print(f"[WEBSOCKET] Invalid binary input from WebSocket: {e}")
+ 
+def get_video_stream(uuid: str, codec: str) -> VideoStream:
+    """Return the shared encoder for (uuid, codec), starting it if needed"""
+    streams = video_streams.setdefault(uuid, {})
+    stream = streams.get(codec)
+    if stream is None or stream.failed:
+        stream = VideoStream(uuid, codec)
+        streams[codec] = stream
+        stream.task = asyncio.create_task(stream.run(lambda: latest_frames.get(uuid)))
+    return stream
+ 
+def release_video_stream(stream: VideoStream, queue: asyncio.Queue):
+    stream.unsubscribe(queue)
+    if not stream.subscribers:
+        streams = video_streams.get(stream.uuid, {})
+        if streams.get(stream.codec) is stream:
+            streams.pop(stream.codec)
+        if not streams:
+            video_streams.pop(stream.uuid, None)
+ 
 @app.websocket("/ws/stream/{uuid}")
-async def websocket_stream(websocket: WebSocket, uuid: str):
+async def websocket_stream(websocket: WebSocket, uuid: str, codec: str = "jpeg", rendition: str = "full"):
     await websocket.accept()
-    print(f"[WEBSOCKET] Connected for UUID: {uuid}")
+    print(f"[WEBSOCKET] Connected for UUID: {uuid} (codec: {codec}, rendition: {rendition})")
+   
+    # Viewers opt into inter-frame streaming with ?codec=h264|vp8; JPEG stays the default
+    if codec != "jpeg":
+        # The first check opens a real encoder, so keep it off the event loop
+        if await asyncio.to_thread(codec_available, codec) and not await stream_encoded(websocket, uuid, codec):
+            return
+        print(f"[WEBSOCKET] Codec {codec} unavailable, falling back to JPEG for UUID: {uuid}")
+        await websocket.send_text(json.dumps({"type": "stream_info", "codec": "jpeg"}))
    
+    if rendition not in RENDITIONS:
+        rendition = "full"
+   
+    viewer = f"jpeg-{rendition}-{next(viewer_id_counter)}"
+    last_sequence = None
     try:
         while True:
-            # Send frame to frontend
+            # Send each new frame once, sharing the encoded rendition with other viewers
             frame = latest_frames.get(uuid)
-            if frame is not None:
-                _, encoded_image = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                await websocket.send_bytes(encoded_image.tobytes())
+            sequence = frame_seq.get(uuid)
+            if frame is not None and sequence != last_sequence:
+                jpeg = rendition_cache.get(uuid, rendition, frame, sequence)
+                if jpeg is not None:
+                    await websocket.send_bytes(jpeg)
+                    traffic_stats.frame_out(uuid, viewer, len(jpeg))
+                # Frames that arrived and were replaced before this viewer got them
+                if last_sequence is not None and sequence - last_sequence > 1:
+                    traffic_stats.frame_dropped(uuid, viewer, sequence - last_sequence - 1)
+                last_sequence = sequence
            
             # Receive and forward input event
             try:
-                msg = await asyncio.wait_for(websocket.receive_text(), timeout=0.01)
-                try:
-                    input_data = json.loads(msg)
-                    if input_data.get("type") in ["mouse_move", "mouse_click", "keyboard"]:
-                        sid = uuid_sid_map.get(uuid)
-                        if sid:
-                            await sio.emit("input_event", input_data, to=sid)
-                        else:
-                            print(f"[WEBSOCKET] No SID found for UUID {uuid}")
-                except json.JSONDecodeError:
-                    print("[WEBSOCKET] Invalid JSON input from WebSocket")
+                msg = await asyncio.wait_for(receive_input(websocket), timeout=0.01)
+                await forward_input(uuid, msg)
             except asyncio.TimeoutError:
                 pass
            
@@ -302,6 +531,144 @@ async def websocket_stream(websocket: WebSocket, uuid: str):
         print(f"[WEBSOCKET] Disconnected for UUID: {uuid}")
     except Exception as e:
         print(f"[WEBSOCKET] Error for UUID {uuid}: {e}")
+    finally:
+        traffic_stats.remove_viewer(uuid, viewer)
+ 
+async def stream_encoded(websocket: WebSocket, uuid: str, codec: str):
+    """Relay packets from the shared inter-frame encoder to one viewer.
+
+    Returns True if the encoder failed and the viewer should continue on JPEG.
+    """
+    stream = get_video_stream(uuid, codec)
+    viewer = f"{codec}-{next(viewer_id_counter)}"
+    queue = stream.subscribe(on_drop=lambda count: traffic_stats.frame_dropped(uuid, viewer, count))
+    print(f"[WEBSOCKET] UUID {uuid} now has {len(stream.subscribers)} {codec} viewer(s)")
+   
+    try:
+        await websocket.send_text(json.dumps({"type": "stream_info", "codec": codec}))
+        while True:
+            # Send every packet queued since the last pass; first one is always a keyframe
+            try:
+                packets = [await asyncio.wait_for(queue.get(), timeout=0.03)]
+                while not queue.empty():
+                    packets.append(queue.get_nowait())
+            except asyncio.TimeoutError:
+                packets = []
+           
+            for packet in packets:
+                if packet is FALLBACK:
+                    print(f"[WEBSOCKET] {codec} encoder failed for UUID {uuid}, switching viewer to JPEG")
+                    return True
+                await websocket.send_bytes(packet)
+                traffic_stats.frame_out(uuid, viewer, len(packet))
+           
+            # Receive and forward input event
+            try:
+                msg = await asyncio.wait_for(receive_input(websocket), timeout=0.01)
+                await forward_input(uuid, msg)
+            except asyncio.TimeoutError:
+                pass
+           
+    except WebSocketDisconnect:
+        print(f"[WEBSOCKET] Disconnected for UUID: {uuid}")
+    except Exception as e:
+        print(f"[WEBSOCKET] Error for UUID {uuid}: {e}")
+    finally:
+        release_video_stream(stream, queue)
+        traffic_stats.remove_viewer(uuid, viewer)
+ 
+@app.websocket("/ws/ingest/{uuid}")
+async def websocket_ingest(websocket: WebSocket, uuid: str, token: str = ""):
+    """Raw WebSocket frame ingest for binary clients (alternative to the Socket.IO `frame` event).
+
+    Only a client with a live Socket.IO connection for `uuid` may ingest: it must pass
+    the token returned by its `open_stream` call.
+    """
+    await websocket.accept()
+    expected_token = ingest_tokens.get(uuid)
+    if uuid not in uuid_sid_map or not expected_token or not secrets.compare_digest(token, expected_token):
+        print(f"[INGEST] Rejected unregistered ingest for UUID: {uuid}")
+        await websocket.close(code=1008)
+        return
+   
+    stream_id = assign_stream_id(uuid)
+    await websocket.send_bytes(pack_hello(stream_id))
+    print(f"[INGEST] Connected for UUID: {uuid} (stream id {stream_id})")
+   
+    try:
+        while True:
+            data = await websocket.receive_bytes()
+           
+            # Socket.IO side disconnected (token revoked): stop accepting frames
+            if ingest_tokens.get(uuid) != expected_token:
+                print(f"[INGEST] Registration ended for UUID {uuid}, closing ingest")
+                await websocket.close(code=1008)
+                break
+           
+            try:
+                frame_stream_id, _, _, frame_data = unpack_frame(data)
+            except ValueError as e:
+                print(f"[INGEST] Invalid frame for UUID {uuid}: {e}")
+                continue
+            if frame_stream_id != stream_id:
+                print(f"[INGEST] Stream id mismatch for UUID {uuid}: {frame_stream_id}")
+                continue
+            await enqueue_frame(uuid, frame_data)
+           
+    except WebSocketDisconnect:
+        print(f"[INGEST] Disconnected for UUID: {uuid}")
+    except Exception as e:
+        print(f"[INGEST] Error for UUID {uuid}: {e}")
+    finally:
+        # Don't leave viewers on a frozen frame once this stream is gone
+        release_stream_state(uuid)
+ 
+@app.websocket("/ws/grid")
+async def websocket_grid(websocket: WebSocket, uuids: str = "", interval: float = 1.0):
+    """Stream thumbnails for many UUIDs over one connection.
+
+    `uuids` is a comma-separated list (empty = every live stream). The viewer can
+    send {"uuids": [...]} at any time to change the selection. Each binary message
+    is one tile packed by `pack_grid_tile`; tiles are only resent when they change.
+    """
+    await websocket.accept()
+    selected = [u for u in uuids.split(",") if u]
+    interval = max(interval, 0.2)
+    print(f"[GRID] Connected, {len(selected) or 'all'} UUID(s) every {interval}s")
+   
+    viewer = f"grid-{next(viewer_id_counter)}"
+    sent_sequences: Dict[str, int] = {}
+    try:
+        while True:
+            for uuid in (selected or list(latest_frames)):
+                frame = latest_frames.get(uuid)
+                sequence = frame_seq.get(uuid)
+                if frame is None or sent_sequences.get(uuid) == sequence:
+                    continue
+                jpeg = rendition_cache.get(uuid, "thumbnail", frame, sequence)
+                if jpeg is not None:
+                    tile = pack_grid_tile(uuid, jpeg)
+                    await websocket.send_bytes(tile)
+                    traffic_stats.frame_out(uuid, viewer, len(tile))
+                sent_sequences[uuid] = sequence
+           
+            # Wait for the next tick, picking up selection changes meanwhile
+            try:
+                msg = await asyncio.wait_for(websocket.receive_text(), timeout=interval)
+                try:
+                    selected = [str(u) for u in json.loads(msg).get("uuids", [])]
+                    sent_sequences = {u: seq for u, seq in sent_sequences.items() if u in selected}
+                except (json.JSONDecodeError, AttributeError):
+                    print("[GRID] Invalid selection message from WebSocket")
+            except asyncio.TimeoutError:
+                pass
+           
+    except WebSocketDisconnect:
+        print("[GRID] Disconnected")
+    except Exception as e:
+        print(f"[GRID] Error: {e}")
+    finally:
+        traffic_stats.forget_viewer(viewer)
  
 @app.post("/request_client/")
 async def request_client(data: dict):
@@ -313,7 +680,7 @@ async def request_client(data: dict):
     if not requested_uuid:
         raise HTTPException(status_code=400, detail="UUID is required")
    
-    client_info = await collection.find_one({"uuid": requested_uuid}, {"_id": 0})
+    client_info = await client_uuid_store.find_by_uuid(requested_uuid, ["LocalIP"])
    
     if not client_info:
         raise HTTPException(status_code=404, detail="Client not found in database")
@@ -334,9 +701,9 @@ async def request_client(data: dict):
     active_sessions[str(requested_uuid)] = True
    
     # Update database (this will trigger MongoDB Change Stream on client side)
-    await collection.update_one(
-        {"uuid": requested_uuid},
-        {"$set": {"Status": "Running", "connection": True}}
+    await client_uuid_store.update_by_uuid(
+        requested_uuid,
+        {"Status": "Running", "connection": True}
     )
    
     # BETTER APPROACH: Push notification via Socket.IO (client listens via on_start_client)
@@ -418,15 +785,17 @@ async def stop_client(data: dict):
    
     if not sid:
         print(f"[STOP] Client {requested_uuid} not connected, updating DB only")
-        await collection.update_one(
-            {"uuid": requested_uuid},
-            {"$set": {"Status": "Stopped", "connection": False}}
+        await client_uuid_store.update_by_uuid(
+            requested_uuid,
+            {"Status": "Stopped", "connection": False}
         )
         active_sessions.pop(str(requested_uuid), None)
+        watched_sessions.pop(str(requested_uuid), None)
         return {"status": "Client was not connected, DB updated"}
    
     # Mark this session as intentionally stopped
     active_sessions[str(requested_uuid)] = False
+    watched_sessions.pop(str(requested_uuid), None)
    
     print(f"[STOP] Marked session {requested_uuid} for intentional disconnect")
     print(f"[STOP] Sending disconnect signal to SID {sid}")
@@ -435,14 +804,117 @@ async def stop_client(data: dict):
     await sio.emit("disconnect_client_info", {"reason": "stop_requested"}, to=sid)
    
     # Update database (disconnect handler will also update, but do it now too)
-    await collection.update_one(
-        {"uuid": requested_uuid},
-        {"$set": {"Status": "Stopped", "connection": False}}
+    await client_uuid_store.update_by_uuid(
+        requested_uuid,
+        {"Status": "Stopped", "connection": False}
     )
    
     print(f"[STOP] Stop signal sent for UUID {requested_uuid}")
     return {"status": "Disconnect signal sent"}
  
+def require_recording():
+    if recorder is None:
+        raise HTTPException(status_code=404, detail="Recording is not enabled")
+ 
+@app.get("/recordings/{uuid}")
+async def get_recordings(uuid: str):
+    require_recording()
+    try:
+        return {"uuid": uuid, "sessions": await asyncio.to_thread(list_sessions, RECORDING_DIR, uuid)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+ 
+@app.get("/recordings/{uuid}/{session}/frame")
+async def get_recording_frame(uuid: str, session: str, ts: int = 0):
+    """JPEG of the recorded frame at or just before `ts` (ms since epoch)"""
+    require_recording()
+    try:
+        # Index loading is file I/O; keep it off the event loop that relays live frames
+        playback = await asyncio.to_thread(SessionPlayback, RECORDING_DIR, uuid, session)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Recording not found")
+   
+    try:
+        if not len(playback):
+            raise HTTPException(status_code=404, detail="Recording is empty")
+        position = playback.seek(ts)
+        try:
+            content = playback.frame(position)
+        except IndexError:
+            # Index entry whose frame data is still being written
+            raise HTTPException(status_code=409, detail="Frame is not available yet")
+        return Response(
+            content=content,
+            media_type="image/jpeg",
+            headers={"X-Frame-Timestamp": str(playback.timestamps[position])}
+        )
+    finally:
+        playback.close()
+ 
+@app.websocket("/ws/playback/{uuid}/{session}")
+async def websocket_playback(websocket: WebSocket, uuid: str, session: str, start: int = 0, speed: float = 1.0):
+    """Replay a recording at its original pace. Send {"seek": ts} to jump."""
+    await websocket.accept()
+    if recorder is None:
+        await websocket.close(code=1008)
+        return
+    try:
+        playback = await asyncio.to_thread(SessionPlayback, RECORDING_DIR, uuid, session)
+    except (ValueError, FileNotFoundError) as e:
+        print(f"[PLAYBACK] Cannot open session {session} for UUID {uuid}: {e}")
+        await websocket.close(code=1008)
+        return
+   
+    print(f"[PLAYBACK] Playing session {session} for UUID {uuid} ({len(playback)} frames)")
+    speed = max(speed, 0.1)
+    position = playback.seek(start)
+    try:
+        while position < len(playback):
+            await websocket.send_bytes(playback.frame(position))
+           
+            # Gap to the next frame, capped so idle stretches don't stall playback
+            delay = 0.0
+            if position + 1 < len(playback):
+                delay = min((playback.timestamps[position + 1] - playback.timestamps[position]) / 1000 / speed, 1.0)
+            position += 1
+           
+            try:
+                msg = await asyncio.wait_for(websocket.receive_text(), timeout=max(delay, 0.001))
+                try:
+                    position = playback.seek(int(json.loads(msg)["seek"]))
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    print("[PLAYBACK] Invalid seek message from WebSocket")
+            except asyncio.TimeoutError:
+                pass
+       
+        await websocket.send_text(json.dumps({"type": "end"}))
+    except WebSocketDisconnect:
+        print(f"[PLAYBACK] Disconnected for UUID: {uuid}")
+    except Exception as e:
+        print(f"[PLAYBACK] Error for UUID {uuid}: {e}")
+    finally:
+        playback.close()
+ 
+@app.get("/stats")
+async def get_all_stats():
+    """Last-minute traffic summary for every tracked UUID"""
+    return {uuid: traffic_stats.snapshot(uuid)["minute"] for uuid in list(traffic_stats.sessions)}
+ 
+@app.get("/stats/{uuid}")
+async def get_stats(uuid: str):
+    """fps in/out, bytes, drops and average frame size over the last minute and hour"""
+    stats = traffic_stats.snapshot(uuid)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No traffic recorded for this UUID")
+    return {"uuid": uuid, **stats}
+ 
+@app.get("/db_stats")
+async def db_stats():
+    """Query counts and timings per MongoDB operation since startup"""
+    return client_uuid_store.stats_snapshot()
+ 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -450,7 +922,9 @@ async def health_check():
         "status": "healthy",
         "connected_clients": len(clients),
         "active_sessions": len(active_sessions),
-        "tracked_uuids": len(uuid_sid_map)
+        "tracked_uuids": len(uuid_sid_map),
+        "video_streams": sum(len(streams) for streams in video_streams.values()),
+        "admission": admission.stats()
     }
  
 def start_server():
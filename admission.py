@@ -0,0 +1,91 @@
+"""
+Admission control for reconnect storms.
+
+Token buckets cap the rate of new Socket.IO connections and, while connects
+are being refused, of ingested frames. Sessions a supervisor is actively watching bypass both limits. Refused
+connects get a jittered retry delay that grows with the current backlog, so a
+mass reconnect after a restart spreads out instead of arriving in waves.
+"""
+import random
+import time
+from collections import deque
+
+MAX_RETRY_DELAY = 60.0
+PRESSURE_WINDOW = 90.0  # Seconds after the last refusal during which we consider ourselves under load
+BACKLOG_WINDOW = 10.0  # Refusals within this window estimate how many clients are waiting
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float = 1.0) -> bool:
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def time_until(self, amount: float = 1.0) -> float:
+        """Seconds until `amount` tokens will be available"""
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+
+class AdmissionController:
+    def __init__(self, connect_rate: float, connect_burst: float, frame_rate: float, frame_burst: float):
+        self.connect_rate = connect_rate
+        self.connect_bucket = TokenBucket(connect_rate, connect_burst)
+        self.frame_bucket = TokenBucket(frame_rate, frame_burst)
+        self.refused_connects = 0
+        self.dropped_frames = 0
+        self._recent_refusals = deque()
+        self._last_refusal = None  # monotonic() of the last refusal; None until one happens
+
+    def admit_connect(self, priority: bool = False):
+        """Return (admitted, retry_after_seconds)"""
+        if self.connect_bucket.try_acquire() or priority:
+            return True, 0.0
+
+        now = time.monotonic()
+        self.refused_connects += 1
+        self._last_refusal = now
+        self._recent_refusals.append(now)
+        while self._recent_refusals and now - self._recent_refusals[0] > BACKLOG_WINDOW:
+            self._recent_refusals.popleft()
+
+        # Everyone refused recently is competing for the same tokens; spread them
+        # over the time it takes to drain that backlog, with full jitter
+        drain_time = self.connect_bucket.time_until() + len(self._recent_refusals) / self.connect_rate
+        retry_after = random.uniform(1.0, max(2.0, 2 * drain_time))
+        return False, round(min(retry_after, MAX_RETRY_DELAY), 2)
+
+    def admit_frame(self, priority: bool = False) -> bool:
+        """Frames are only rationed during a reconnect storm; otherwise every frame passes"""
+        if priority or not self.under_pressure() or self.frame_bucket.try_acquire():
+            return True
+        self.dropped_frames += 1
+        return False
+
+    def under_pressure(self) -> bool:
+        """True while connects are being (or were recently) refused"""
+        if self._last_refusal is None:
+            return False
+        return time.monotonic() - self._last_refusal < PRESSURE_WINDOW
+
+    def stats(self) -> dict:
+        return {
+            "refused_connects": self.refused_connects,
+            "dropped_frames": self.dropped_frames,
+            "under_pressure": self.under_pressure(),
+        }
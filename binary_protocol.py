@@ -0,0 +1,86 @@
+"""
+Compact binary framing for frames and input events.
+
+Frame message (network byte order):
+    version (1) | type (1) | stream id (4) | sequence (4) | timestamp ms (8) | JPEG bytes
+
+Hello message, sent by the server when a binary ingest stream is opened:
+    version (1) | type (1) | stream id (4)
+
+Input record:
+    type (1) | flags (1) | x (2) | y (2) | code length (1) | code (utf-8)
+
+x and y are normalized coordinates scaled to 0..65535. `code` is the mouse
+button name or the key string. Legacy clients keep using dict/JSON payloads.
+"""
+import struct
+
+PROTOCOL_VERSION = 1
+
+MSG_FRAME = 1
+MSG_HELLO = 2
+
+FRAME_HEADER = struct.Struct("!BBIIQ")
+HELLO = struct.Struct("!BBI")
+INPUT_RECORD = struct.Struct("!BBHHB")
+
+INPUT_TYPES = {"mouse_move": 1, "mouse_click": 2, "keyboard": 3}
+INPUT_NAMES = {code: name for name, code in INPUT_TYPES.items()}
+FLAG_PRESSED = 0x01
+
+COORD_SCALE = 0xFFFF
+
+
+def pack_frame(stream_id: int, sequence: int, timestamp_ms: int, payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(PROTOCOL_VERSION, MSG_FRAME, stream_id,
+                             sequence & 0xFFFFFFFF, timestamp_ms) + payload
+
+
+def unpack_frame(data: bytes):
+    """Return (stream_id, sequence, timestamp_ms, payload) from a frame message"""
+    if len(data) <= FRAME_HEADER.size:
+        raise ValueError("frame message too short")
+    version, msg_type, stream_id, sequence, timestamp_ms = FRAME_HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION or msg_type != MSG_FRAME:
+        raise ValueError(f"unexpected frame header (version {version}, type {msg_type})")
+    return stream_id, sequence, timestamp_ms, memoryview(data)[FRAME_HEADER.size:]
+
+
+def pack_hello(stream_id: int) -> bytes:
+    return HELLO.pack(PROTOCOL_VERSION, MSG_HELLO, stream_id)
+
+
+def _scale(value) -> int:
+    return min(max(int(round(float(value) * COORD_SCALE)), 0), COORD_SCALE)
+
+
+def pack_input(event: dict) -> bytes:
+    """Encode an input event dict (same shape as the JSON events) as a binary record"""
+    code = str(event.get("button") or event.get("key") or "").encode("utf-8")[:255]
+    flags = FLAG_PRESSED if event.get("pressed") else 0
+    return INPUT_RECORD.pack(INPUT_TYPES[event["type"]], flags,
+                             _scale(event.get("x", 0)), _scale(event.get("y", 0)),
+                             len(code)) + code
+
+
+def unpack_input(data: bytes) -> dict:
+    """Decode a binary input record back into the JSON event shape"""
+    if len(data) < INPUT_RECORD.size:
+        raise ValueError("input record too short")
+    type_code, flags, x, y, code_length = INPUT_RECORD.unpack_from(data)
+    event_type = INPUT_NAMES.get(type_code)
+    if event_type is None:
+        raise ValueError(f"unknown input type {type_code}")
+    code = bytes(data[INPUT_RECORD.size:INPUT_RECORD.size + code_length]).decode("utf-8", "replace")
+
+    event = {"type": event_type}
+    if event_type != "keyboard":
+        event["x"] = x / COORD_SCALE
+        event["y"] = y / COORD_SCALE
+    if event_type == "mouse_click":
+        event["button"] = code
+    elif event_type == "keyboard":
+        event["key"] = code
+    if event_type != "mouse_move":
+        event["pressed"] = bool(flags & FLAG_PRESSED)
+    return event
@@ -1,9 +1,10 @@
 import asyncio
 import os
-import psutil
+import errno
+import json
+import time
 import logging
 from live_monitor import client_main,sio
-from client_register import monitor_ip_change
 from utils.config import RUN_CLIENT_REGISTER,RUN_LIVE_MONITOR,CHECK_LIVE,get_tenant_name_from_json,get_user_email,check_live_connection_status,fetch_employee_transaction_id
  
  
@@ -11,6 +12,59 @@ from utils.config import RUN_CLIENT_REGISTER,RUN_LIVE_MONITOR,CHECK_LIVE,get_ten
  
  
  
+# Local state: identity cache and single-instance lock
+APP_DATA_DIR = os.path.join(os.getenv("LOCALAPPDATA") or os.path.expanduser("~"), "EbantisLive")
+IDENTITY_CACHE_FILE = os.path.join(APP_DATA_DIR, "identity.json")
+IDENTITY_CACHE_TTL = 24 * 60 * 60  # Re-check the employee id with the server daily
+IDENTITY_CACHE_VERSION = 1
+LOCK_FILE = os.path.join(APP_DATA_DIR, "client.lock")
+ 
+ 
+def load_cached_identity(key):
+    """Return the cached UUID if it was resolved for the same tenant/user/email and hasn't expired"""
+    try:
+        with open(IDENTITY_CACHE_FILE, "r") as f:
+            cached = json.load(f)
+        if (cached.get("version") == IDENTITY_CACHE_VERSION
+                and cached.get("key") == key
+                and cached.get("uuid")
+                and time.time() - cached.get("resolved_at", 0) < IDENTITY_CACHE_TTL):
+            return cached["uuid"]
+    except (OSError, ValueError, AttributeError, TypeError):
+        # Missing, unreadable or malformed cache (e.g. resolved_at not a number): resolve again
+        pass
+    return None
+ 
+ 
+def save_cached_identity(key, uuid):
+    try:
+        os.makedirs(APP_DATA_DIR, exist_ok=True)
+        tmp_file = IDENTITY_CACHE_FILE + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"version": IDENTITY_CACHE_VERSION, "key": key, "uuid": uuid, "resolved_at": time.time()}, f)
+        os.replace(tmp_file, IDENTITY_CACHE_FILE)
+    except OSError as e:
+        logging.error(f"Could not write identity cache: {e}")
+ 
+ 
+def resolve_identity():
+    """Resolve this machine's UUID once, using the on-disk cache to skip the remote lookup"""
+    user_email = get_user_email()
+    tenant_name = get_tenant_name_from_json()
+    user_name = os.getlogin()
+    key = [tenant_name, user_name, user_email]
+ 
+    uuid = load_cached_identity(key)
+    if uuid:
+        print(f"[IDENTITY] Using cached UUID: {uuid}")
+        return uuid
+ 
+    uuid = fetch_employee_transaction_id(tenant_name, user_name, user_email)
+    if uuid:
+        save_cached_identity(key, uuid)
+    return uuid
+ 
+ 
 # Event handler sets it to True
 @sio.on('check_live_status_start')
 async def on_check_live_status_start(data):
@@ -32,16 +86,78 @@ async def on_start_client(data):
         except Exception as e:
             logging.error(f"Error starting client: {e}")
 
+# Reconnect pacing suggested by the server while it refuses connections.
+# python-socketio reads reconnection_delay once per reconnect loop, so changing it
+# mid-storm has no effect; instead we take over the retry loop ourselves.
+MAX_SELF_RETRY_DELAY = 60
+suggested_retry_delay = None
+server_retry_task = None
+
+
+async def retry_connect_after_refusal():
+    """Reconnect on the server's schedule: wait the suggested delay, then connect once"""
+    global suggested_retry_delay
+    delay = suggested_retry_delay
+    while True:
+        print(f"[CONNECT] Server is busy, retrying in {delay}s")
+        await asyncio.sleep(delay)
+        suggested_retry_delay = None
+        try:
+            await sio.connect(
+                sio.connection_url,
+                headers=sio.connection_headers,
+                auth=sio.connection_auth,
+                transports=sio.connection_transports,
+                namespaces=sio.connection_namespaces,
+                socketio_path=sio.socketio_path,
+            )
+            return
+        except Exception as e:
+            # Refused again -> on_connect_error stored a fresh suggestion; otherwise back off
+            delay = suggested_retry_delay or min(delay * 2, MAX_SELF_RETRY_DELAY)
+            logging.error(f"[CONNECT] Reconnect failed: {e}")
+
+
+# Server refuses connections during reconnect storms and suggests a jittered delay
+@sio.on('connect_error')
+async def on_connect_error(data):
+    global suggested_retry_delay, server_retry_task
+    # Refusal arrives as {"message": ..., "data": {"retry_after": ...}}
+    details = data.get("data") if isinstance(data, dict) else None
+    retry_after = details.get("retry_after") if isinstance(details, dict) else None
+    if not retry_after:
+        return
+
+    suggested_retry_delay = retry_after
+    if server_retry_task is None or server_retry_task.done():
+        # Stop the library's own backoff loop and honour the server's delay as a minimum wait
+        sio.reconnection = False
+        reconnect_abort = getattr(sio, "_reconnect_abort", None)
+        if reconnect_abort is not None:
+            reconnect_abort.set()
+        server_retry_task = asyncio.create_task(retry_connect_after_refusal())
+
+
+# Wrap any connect handler live_monitor registered, so ours doesn't replace it
+previous_connect_handler = sio.handlers.get("/", {}).get("connect")
+
+
+@sio.on('connect')
+async def on_connect(*args):
+    # Back to normal: let python-socketio handle unrelated drops with its default backoff
+    global suggested_retry_delay
+    suggested_retry_delay = None
+    sio.reconnection = True
+    if previous_connect_handler is not None:
+        result = previous_connect_handler(*args)
+        if asyncio.iscoroutine(result):
+            await result
+
 # OLD POLLING METHOD - DISABLED TO REDUCE DTU
 # Use MongoDB Change Streams instead (see setup_mongodb_change_stream below)
-async def live_monitor_task():
+async def live_monitor_task(uuid):
     logging.info("Starting live monitor with MongoDB Change Streams...")
     try:
-        user_email = get_user_email()
-        tenant_name = get_tenant_name_from_json()
-        user_name = os.getlogin()
-        employee_transaction_id = fetch_employee_transaction_id(tenant_name, user_name, user_email)
-        uuid = employee_transaction_id
         print(f"[MONITOR] UUID: {uuid}")
         
         # Setup MongoDB Change Stream listener instead of polling
@@ -111,16 +227,11 @@ async def fallback_polling(uuid):
             await asyncio.sleep(30)
  
  
-async def client_register_task():
+async def client_register_task(uuid):
     logging.info("Starting  register client...")
     try:
-        user_email = get_user_email()
-        tenant_name=get_tenant_name_from_json()
-        user_name=os.getlogin()
-        # tenant_id = get_tenant_id_by_name()
-        employee_transaction_id = fetch_employee_transaction_id(tenant_name,user_name,user_email)
-        # print("email",user_email,credentials,tenant_id)
-        uuid = employee_transaction_id
+        # Imported here so it doesn't delay the live connection at startup
+        from client_register import monitor_ip_change
         print("UUID",uuid)
         # Run the sync function in a separate thread
         await asyncio.to_thread(monitor_ip_change,uuid)
@@ -133,39 +244,63 @@ async def client_register_task():
 async def main():
     logging.info("Starting all tasks with prepared environment...")
  
+    # Resolve identity once and share it between both tasks
+    try:
+        uuid = await asyncio.to_thread(resolve_identity)
+    except Exception as e:
+        logging.error(f"An error occurred resolving client identity: {e}")
+        return
+ 
     tasks = []
     if RUN_LIVE_MONITOR:
-        tasks.append(asyncio.create_task(live_monitor_task()))
+        tasks.append(asyncio.create_task(live_monitor_task(uuid)))
      
     if RUN_CLIENT_REGISTER:
-        tasks.append(asyncio.create_task(client_register_task()))
+        tasks.append(asyncio.create_task(client_register_task(uuid)))
  
     await asyncio.gather(*tasks)
  
  
-def is_another_instance_running(exe_name):
+def acquire_instance_lock():
     """
-    Returns True if another instance of exe_name is running (excluding this process).
+    Takes an exclusive lock on LOCK_FILE. Returns False only if another instance
+    already holds the lock. Otherwise returns the open handle (keep it for the life
+    of the process), or True if the lock file can't be used at all - in that case
+    we fail open and run, as before the single-instance check existed.
+    The OS releases the lock when the process exits, so it can't go stale.
     """
-    current_pid = os.getpid()
-    count = 0
-    for proc in psutil.process_iter(['name', 'exe', 'pid']):
-        try:
-            if proc.info['name'] and proc.info['name'].lower() == exe_name.lower():
-                if proc.info['pid'] != current_pid:
-                    count += 1
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            continue
-    return count > 1
+    try:
+        os.makedirs(APP_DATA_DIR, exist_ok=True)
+        handle = open(LOCK_FILE, "a+")
+    except OSError as e:
+        logging.error(f"Could not open instance lock file, skipping single-instance check: {e}")
+        return True
+ 
+    try:
+        if os.name == "nt":
+            import msvcrt
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError as e:
+        handle.close()
+        # EACCES/EDEADLOCK (msvcrt) and EWOULDBLOCK (flock) mean the lock is held
+        if isinstance(e, BlockingIOError) or e.errno in (errno.EACCES, errno.EAGAIN, errno.EDEADLOCK):
+            return False
+        logging.error(f"Could not take instance lock, skipping single-instance check: {e}")
+        return True
+    return handle
  
  
 if __name__ == "__main__":
     try:
-        exe_name = 'RemoteDesktop.exe'
-        # if not is_another_instance_running(exe_name):
-        asyncio.run(main())
-        # else:
-            # print("Already running")
+        instance_lock = acquire_instance_lock()
+        if instance_lock:
+            asyncio.run(main())
+        else:
+            print("Already running")
     except Exception as e:
         pass
 # if __name__ == "__main__":
@@ -0,0 +1,91 @@
+"""
+Shared MongoDB access for the Client_uuid collection.
+
+Used by both CentralServer.py and server.py so that every query:
+  - goes through one cached collection handle,
+  - is backed by an index created/verified at startup,
+  - fetches only the fields it needs (projection),
+  - is counted and timed, so DTU savings can be measured per operation.
+"""
+import time
+from typing import Dict, Iterable, Optional
+
+DB_NAME = "EbantisV3"
+CLIENT_UUID_COLLECTION = "Client_uuid"
+
+# Fields every query filters on -> index name
+CLIENT_UUID_INDEXES = {
+    "uuid": "uuid_1",
+    "EmployeeTransactionId": "EmployeeTransactionId_1",
+    "Status": "Status_1",
+}
+
+
+def _projection(fields: Iterable[str]) -> dict:
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    return projection
+
+
+class ClientUuidStore:
+    def __init__(self, database):
+        self.collection = database[CLIENT_UUID_COLLECTION]
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    async def ensure_indexes(self):
+        """Create any missing index the query paths rely on; returns the names created"""
+        existing = await self.collection.index_information()
+        # Any index whose leading key is the field serves equality lookups on it
+        indexed_fields = {info["key"][0][0] for info in existing.values()}
+
+        created = []
+        for field, name in CLIENT_UUID_INDEXES.items():
+            if field in indexed_fields:
+                print(f"[DB] Index on {field} verified")
+                continue
+            await self.collection.create_index(field, name=name)
+            print(f"[DB] Created index {name}")
+            created.append(name)
+        return created
+
+    async def _timed(self, operation: str, coro):
+        stats = self.stats.setdefault(operation, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        start = time.perf_counter()
+        try:
+            return await coro
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    async def find_by_uuid(self, uuid, fields: Iterable[str]) -> Optional[dict]:
+        return await self._timed("find_by_uuid",
+                                 self.collection.find_one({"uuid": uuid}, _projection(fields)))
+
+    async def find_by_employee_id(self, employee_id, fields: Iterable[str]) -> Optional[dict]:
+        return await self._timed("find_by_employee_id",
+                                 self.collection.find_one({"EmployeeTransactionId": employee_id}, _projection(fields)))
+
+    async def find_uuids_by_status(self, status: str):
+        cursor = self.collection.find({"Status": status}, _projection(["uuid"]))
+        documents = await self._timed("find_uuids_by_status", cursor.to_list(length=None))
+        return [document["uuid"] for document in documents if "uuid" in document]
+
+    async def update_by_uuid(self, uuid, values: dict):
+        return await self._timed("update_by_uuid",
+                                 self.collection.update_one({"uuid": uuid}, {"$set": values}))
+
+    def stats_snapshot(self) -> dict:
+        return {
+            operation: {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total_ms"] / stats["count"], 2) if stats["count"] else 0.0,
+                "max_ms": round(stats["max_ms"], 2),
+            }
+            for operation, stats in self.stats.items()
+        }
@@ -0,0 +1,61 @@
+"""
+Multi-resolution rendition cache for live frames.
+
+Each rendition (thumbnail, medium, full) of a UUID's latest frame is encoded
+at most once per new frame and the JPEG bytes are reused by every viewer that
+asks for it, so N viewers of the same stream cost one encode instead of N.
+"""
+import struct
+from typing import Dict, Optional, Tuple
+
+import cv2
+
+# rendition name -> (max width in px or None for native size, JPEG quality)
+RENDITIONS = {
+    "thumbnail": (320, 60),
+    "medium": (960, 75),
+    "full": (None, 85),
+}
+
+# Grid message: uuid length (2 bytes), uuid (utf-8), then the JPEG bytes
+GRID_HEADER = struct.Struct("!H")
+
+
+def encode_rendition(frame, rendition: str) -> Optional[bytes]:
+    max_width, quality = RENDITIONS[rendition]
+    height, width = frame.shape[:2]
+    if max_width and width > max_width:
+        scaled_height = max(1, round(height * max_width / width))
+        frame = cv2.resize(frame, (max_width, scaled_height), interpolation=cv2.INTER_AREA)
+
+    ok, encoded_image = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        return None
+    return encoded_image.tobytes()
+
+
+def pack_grid_tile(uuid: str, jpeg: bytes) -> bytes:
+    uuid_bytes = uuid.encode("utf-8")
+    return GRID_HEADER.pack(len(uuid_bytes)) + uuid_bytes + jpeg
+
+
+class RenditionCache:
+    """Caches encoded renditions per UUID, keyed by the frame sequence number."""
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Tuple[int, bytes]]] = {}
+
+    def get(self, uuid: str, rendition: str, frame, sequence: int) -> Optional[bytes]:
+        """Return the encoded `rendition` of `frame`, encoding it only if `sequence` is new"""
+        renditions = self._entries.setdefault(uuid, {})
+        cached = renditions.get(rendition)
+        if cached is not None and cached[0] == sequence:
+            return cached[1]
+
+        data = encode_rendition(frame, rendition)
+        if data is not None:
+            renditions[rendition] = (sequence, data)
+        return data
+
+    def discard(self, uuid: str):
+        self._entries.pop(uuid, None)
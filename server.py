@@ -1,11 +1,50 @@
-@router.post("/LiveServer/")
-async def send_uuid_to_centralized_server(data: dict):
+import asyncio
+from data_access import DB_NAME, ClientUuidStore
+ 
+# One store (and collection handle) for the life of the process
+client_uuid_store = None
+indexes_verified = False
+index_check = None  # In-flight retry of the index check, if any
+ 
+ 
+def get_client_uuid_store():
+    global client_uuid_store
+    if client_uuid_store is None:
+        client_uuid_store = ClientUuidStore(mongo.get_database(DB_NAME))
+    return client_uuid_store
+ 
+ 
+async def verify_indexes():
+    global indexes_verified
     try:
+        await get_client_uuid_store().ensure_indexes()
+        indexes_verified = True
+    except Exception as e:
+        print(f"Could not verify MongoDB indexes, will retry: {e}")
  
  
-       
-        db = mongo.get_database("EbantisV3")
-        collection = db["Client_uuid"]
+@router.on_event("startup")
+async def verify_indexes_on_startup():
+    await verify_indexes()
+ 
+ 
+def retry_index_check():
+    """Re-run a failed startup index check in the background, off the request path"""
+    global index_check
+    if not indexes_verified and (index_check is None or index_check.done()):
+        index_check = asyncio.create_task(verify_indexes())
+ 
+ 
+@router.get("/LiveServer/db_stats/")
+async def live_server_db_stats():
+    return get_client_uuid_store().stats_snapshot()
+ 
+ 
+@router.post("/LiveServer/")
+async def send_uuid_to_centralized_server(data: dict):
+    try:
+        store = get_client_uuid_store()
+        retry_index_check()
  
         if ENCRYPTION == True:
             print("true block")
@@ -27,7 +66,7 @@ async def send_uuid_to_centralized_server(data: dict):
             live_key=int(data["LiveKey"])
             print(live_key)
  
-        document = await collection.find_one({"EmployeeTransactionId": emp_id})
+        document = await store.find_by_employee_id(emp_id, ["uuid", "Status"])
         print("Document",document)
  
         if not document:
@@ -44,10 +83,7 @@ async def send_uuid_to_centralized_server(data: dict):
         status = document["Status"]
  
         # Update MongoDB to set connection: True
-        await collection.update_one(
-            {"uuid": UUID},
-            {"$set": {"connection": True}}
-        )
+        await store.update_by_uuid(UUID, {"connection": True})
         print(f"Updated connection status for UUID: {UUID}")
 
         # REMOVED: Unnecessary 20-second wait + MongoDB polling
@@ -67,10 +103,7 @@ async def send_uuid_to_centralized_server(data: dict):
             return {"message": "success"}
         else:
             # If centralized server fails, reset connection status
-            await collection.update_one(
-                {"uuid": UUID},
-                {"$set": {"connection": False}}
-            )
+            await store.update_by_uuid(UUID, {"connection": False})
             print(f"Error: {response.text}")
             raise HTTPException(status_code=response.status_code, detail="Failed to contact centralized server")
  
@@ -0,0 +1,307 @@
+"""
+Append-only session recording with memory-mapped playback.
+
+Encoded frames are teed from the ingest path into a bounded queue and written
+by a background thread, so recording never blocks the event loop. Each
+session is stored as:
+
+    <root>/<uuid>/<session id>/<segment>.seg   raw JPEG bytes, back to back
+    <root>/<uuid>/<session id>/<segment>.idx   INDEX_RECORD per frame
+
+The session id is the start time in milliseconds. Playback memory-maps the
+segment and index files and seeks by binary search over the timestamps.
+"""
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+INDEX_RECORD = struct.Struct("<qII")  # timestamp ms, offset in segment, length
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+WRITE_QUEUE_SIZE = 2000  # Frames buffered for the writer before new ones are dropped
+IDLE_CLOSE_SECONDS = 30  # Close a session that has received no frames for this long
+HOUSEKEEPING_SECONDS = 1.0  # How often the writer flushes and closes finished sessions
+CLOSE_GRACE_MS = 5000  # Frames still queued when a session is closed land in it within this window
+INDEX_BUFFER_BYTES = 8192  # Index records held back until their frame data is flushed
+CLOSE_TIMEOUT_SECONDS = 10  # How long close() waits for queued frames to be written
+
+_STOP = object()  # Queued by close(); frames already ahead of it are still written
+
+
+def _session_dir(root: str, uuid: str, session: Optional[str] = None) -> str:
+    # Both components come from URLs, so refuse anything that could leave `root`
+    if not uuid or uuid != os.path.basename(uuid) or uuid.startswith("."):
+        raise ValueError(f"invalid uuid {uuid!r}")
+    if session is None:
+        return os.path.join(root, uuid)
+    if not session.isdigit():
+        raise ValueError(f"invalid session {session!r}")
+    return os.path.join(root, uuid, session)
+
+
+def _segment_path(directory: str, segment: int, extension: str) -> str:
+    return os.path.join(directory, f"{segment:05d}.{extension}")
+
+
+class _SessionWriter:
+    """Appends frames for one session. Only touched by the writer thread."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment = -1
+        self.data_file = None
+        self.index_file = None
+        self.offset = 0
+        self.pending_index = bytearray()
+        self.last_write = time.monotonic()
+        self._open_next_segment()
+
+    def _open_next_segment(self):
+        self.close()
+        self.segment += 1
+        self.data_file = open(_segment_path(self.directory, self.segment, "seg"), "ab")
+        # Unbuffered: index records only reach it from flush(), after their data
+        self.index_file = open(_segment_path(self.directory, self.segment, "idx"), "ab", buffering=0)
+        self.offset = 0
+
+    def append(self, timestamp_ms: int, data: bytes):
+        if self.offset and self.offset + len(data) > SEGMENT_MAX_BYTES:
+            self._open_next_segment()
+        self.data_file.write(data)
+        self.pending_index += INDEX_RECORD.pack(timestamp_ms, self.offset, len(data))
+        self.offset += len(data)
+        self.last_write = time.monotonic()
+        if len(self.pending_index) >= INDEX_BUFFER_BYTES:
+            self.flush()
+
+    def flush(self):
+        # Data before index, so a reader never sees an entry past the end of the data
+        self.data_file.flush()
+        if self.pending_index:
+            self.index_file.write(self.pending_index)
+            self.pending_index.clear()
+
+    def close(self):
+        if self.data_file is not None:
+            self.flush()
+        for f in (self.data_file, self.index_file):
+            if f is not None:
+                f.close()
+        self.data_file = None
+        self.index_file = None
+
+
+class SessionRecorder:
+    """Background writer for per-session recordings."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.dropped = 0
+        self._closed = False
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        # Close requests bypass the bounded frame queue so they are never dropped
+        self._close_requests = queue.SimpleQueue()
+        self._pending_closes: Dict[str, int] = {}
+        self._writers: Dict[str, _SessionWriter] = {}
+        self._thread = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+        self._thread.start()
+
+    def tee(self, uuid: str, frame_data):
+        """Queue an encoded frame for recording. Never blocks; drops when the writer is behind."""
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait((uuid, int(time.time() * 1000), bytes(frame_data)))
+        except queue.Full:
+            self.dropped += 1
+
+    def close_session(self, uuid: str):
+        """End the current session for `uuid`; the next frame starts a new one"""
+        self._close_requests.put((uuid, int(time.time() * 1000)))
+
+    def close(self):
+        """Write out everything already queued, close all sessions and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        # Blocking put: if the queue is full, wait for the writer to make room
+        self._queue.put(_STOP)
+        self._thread.join(CLOSE_TIMEOUT_SECONDS)
+        if self._thread.is_alive():
+            print(f"[RECORDER] Writer did not finish within {CLOSE_TIMEOUT_SECONDS}s")
+
+    def _run(self):
+        next_housekeeping = time.monotonic() + HOUSEKEEPING_SECONDS
+        while True:
+            try:
+                item = self._queue.get(timeout=HOUSEKEEPING_SECONDS)
+                if item is _STOP:
+                    break
+                uuid, timestamp_ms, data = item
+                self._append(uuid, timestamp_ms, data)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                print(f"[RECORDER] Error writing frame for UUID {uuid}: {e}")
+
+            # Runs on a clock, not only when idle, so a busy queue can't starve it
+            now = time.monotonic()
+            if now >= next_housekeeping:
+                next_housekeeping = now + HOUSEKEEPING_SECONDS
+                self._housekeeping(now)
+            elif self._queue.empty():
+                self._flush_all()
+
+        for uuid in list(self._writers):
+            self._close_writer(uuid)
+        print("[RECORDER] Writer stopped")
+
+    def _drain_close_requests(self):
+        while not self._close_requests.empty():
+            uuid, close_ms = self._close_requests.get()
+            self._pending_closes[uuid] = close_ms
+
+    def _append(self, uuid: str, timestamp_ms: int, data: bytes):
+        self._drain_close_requests()
+        writer = self._writers.get(uuid)
+        close_ms = self._pending_closes.get(uuid)
+        if close_ms is not None and timestamp_ms > close_ms:
+            # First frame after a disconnect: finish the old session, start a new one
+            self._pending_closes.pop(uuid, None)
+            self._close_writer(uuid)
+            writer = None
+
+        if writer is None:
+            writer = _SessionWriter(_session_dir(self.root, uuid, str(timestamp_ms)))
+            self._writers[uuid] = writer
+        writer.append(timestamp_ms, data)
+
+    def _close_writer(self, uuid: str):
+        writer = self._writers.pop(uuid, None)
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception as e:
+                print(f"[RECORDER] Error closing session for UUID {uuid}: {e}")
+
+    def _flush_all(self):
+        for uuid, writer in list(self._writers.items()):
+            try:
+                writer.flush()
+            except Exception as e:
+                print(f"[RECORDER] Error flushing session for UUID {uuid}: {e}")
+
+    def _housekeeping(self, now: float):
+        # Close disconnected sessions once frames queued before the close have landed
+        self._drain_close_requests()
+        now_ms = int(time.time() * 1000)
+        for uuid, close_ms in list(self._pending_closes.items()):
+            if now_ms - close_ms > CLOSE_GRACE_MS:
+                self._pending_closes.pop(uuid, None)
+                self._close_writer(uuid)
+
+        for uuid, writer in list(self._writers.items()):
+            if now - writer.last_write > IDLE_CLOSE_SECONDS:
+                self._close_writer(uuid)
+
+        self._flush_all()
+
+
+def list_sessions(root: str, uuid: str) -> List[dict]:
+    """Recorded sessions for `uuid`, oldest first"""
+    directory = _session_dir(root, uuid)
+    if not os.path.isdir(directory):
+        return []
+
+    sessions = []
+    for session in sorted(os.listdir(directory), key=lambda name: int(name) if name.isdigit() else -1):
+        if not session.isdigit():
+            continue
+        session_path = os.path.join(directory, session)
+        frames = 0
+        size = 0
+        for name in os.listdir(session_path):
+            file_size = os.path.getsize(os.path.join(session_path, name))
+            if name.endswith(".idx"):
+                frames += file_size // INDEX_RECORD.size
+            elif name.endswith(".seg"):
+                size += file_size
+        sessions.append({"session": session, "start": int(session), "frames": frames, "bytes": size})
+    return sessions
+
+
+class SessionPlayback:
+    """Memory-mapped, seekable reader for one recorded session."""
+
+    def __init__(self, root: str, uuid: str, session: str):
+        self.directory = _session_dir(root, uuid, session)
+        if not os.path.isdir(self.directory):
+            raise FileNotFoundError(f"session {session} not found for UUID {uuid}")
+
+        self.timestamps = array("q")
+        # offset | length << 32, matching the little-endian "II" tail of INDEX_RECORD
+        self._locations = array("q")
+        self._segment_starts: List[int] = []  # Position of each segment's first frame
+        self._maps: Dict[int, mmap.mmap] = {}
+
+        segment = 0
+        while os.path.exists(_segment_path(self.directory, segment, "idx")):
+            self._load_index(segment)
+            segment += 1
+
+    def _map(self, path: str) -> Optional[mmap.mmap]:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load_index(self, segment: int):
+        self._segment_starts.append(len(self.timestamps))
+        index_map = self._map(_segment_path(self.directory, segment, "idx"))
+        if index_map is None:
+            return
+        try:
+            # Bulk-load as pairs of int64 instead of unpacking record by record.
+            # Ignore a trailing partial record from a write in progress.
+            usable = len(index_map) - len(index_map) % INDEX_RECORD.size
+            records = array("q")
+            records.frombytes(index_map[:usable])
+            if sys.byteorder != "little":
+                records.byteswap()
+            self.timestamps.extend(records[0::2])
+            self._locations.extend(records[1::2])
+        finally:
+            index_map.close()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def seek(self, timestamp_ms: int) -> int:
+        """Position of the last frame at or before `timestamp_ms` (0 if it precedes the session)"""
+        return max(bisect_right(self.timestamps, timestamp_ms) - 1, 0)
+
+    def frame(self, position: int) -> bytes:
+        segment = bisect_right(self._segment_starts, position) - 1
+        data_map = self._maps.get(segment)
+        if data_map is None:
+            data_map = self._map(_segment_path(self.directory, segment, "seg"))
+            self._maps[segment] = data_map
+        location = self._locations[position]
+        offset = location & 0xFFFFFFFF
+        length = location >> 32
+        if data_map is None or offset + length > len(data_map):
+            raise IndexError(f"frame {position} is past the end of segment {segment}")
+        return data_map[offset:offset + length]
+
+    def close(self):
+        for data_map in self._maps.values():
+            if data_map is not None:
+                data_map.close()
+        self._maps.clear()
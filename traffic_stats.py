@@ -0,0 +1,160 @@
+"""
+Per-session traffic statistics over rolling windows.
+
+Each session (and each of its viewers) gets a RollingCounter: two fixed-size
+ring buffers of per-second buckets (last minute) and per-minute buckets (last
+hour). Updating is O(1) and memory per session is constant, no matter how
+many frames flow through it.
+"""
+import time
+from array import array
+from typing import Dict
+
+import numpy as np
+
+METRICS = ("frames_in", "bytes_in", "frames_out", "bytes_out", "drops")
+FRAMES_IN, BYTES_IN, FRAMES_OUT, BYTES_OUT, DROPS = range(len(METRICS))
+WIDTH = len(METRICS)
+
+SLOTS = 60
+WINDOWS = {"minute": 60, "hour": 3600}
+_EMPTY_ROW = array("q", [0] * WIDTH)
+
+
+class RollingCounter:
+    """Flat array('q') ring buffers: cheap integer-indexed updates on the hot path,
+    viewed as numpy arrays (without copying) only when totals are queried."""
+
+    def __init__(self):
+        self.seconds = array("q", [0] * (SLOTS * WIDTH))
+        self.second_stamps = array("q", [-1] * SLOTS)
+        self.minutes = array("q", [0] * (SLOTS * WIDTH))
+        self.minute_stamps = array("q", [-1] * SLOTS)
+
+    def _rows(self, now: float):
+        """Base index of the current second and minute rows, resetting reused slots"""
+        second = int(now if now is not None else time.time())
+        minute = second // 60
+
+        slot = second % SLOTS
+        second_row = slot * WIDTH
+        if self.second_stamps[slot] != second:
+            # Slot last held a second from a previous lap of the ring: reuse it
+            self.seconds[second_row:second_row + WIDTH] = _EMPTY_ROW
+            self.second_stamps[slot] = second
+
+        slot = minute % SLOTS
+        minute_row = slot * WIDTH
+        if self.minute_stamps[slot] != minute:
+            self.minutes[minute_row:minute_row + WIDTH] = _EMPTY_ROW
+            self.minute_stamps[slot] = minute
+        return second_row, minute_row
+
+    def add(self, metric: int, amount: int = 1, now: float = None):
+        second_row, minute_row = self._rows(now)
+        self.seconds[second_row + metric] += amount
+        self.minutes[minute_row + metric] += amount
+
+    def add_frame(self, frames_metric: int, size: int, now: float = None):
+        """Count one frame and its bytes (FRAMES_IN/BYTES_IN or FRAMES_OUT/BYTES_OUT)"""
+        second_row, minute_row = self._rows(now)
+        self.seconds[second_row + frames_metric] += 1
+        self.seconds[second_row + frames_metric + 1] += size
+        self.minutes[minute_row + frames_metric] += 1
+        self.minutes[minute_row + frames_metric + 1] += size
+
+    def totals(self, window: str, now: float = None) -> Dict[str, int]:
+        """Sum of each metric over the last minute or hour"""
+        second = int(now if now is not None else time.time())
+        if window == "minute":
+            stamps, buckets, current = self.second_stamps, self.seconds, second
+        else:
+            stamps, buckets, current = self.minute_stamps, self.minutes, second // 60
+        stamps = np.frombuffer(stamps, dtype=np.int64)
+        buckets = np.frombuffer(buckets, dtype=np.int64).reshape(SLOTS, WIDTH)
+        live = (stamps > current - SLOTS) & (stamps <= current)
+        return dict(zip(METRICS, buckets[live].sum(axis=0).tolist()))
+
+
+def _summarize(totals: Dict[str, int], window: str) -> dict:
+    seconds = WINDOWS[window]
+    return {
+        "fps_in": round(totals["frames_in"] / seconds, 2),
+        "fps_out": round(totals["frames_out"] / seconds, 2),
+        "bytes_in": totals["bytes_in"],
+        "bytes_out": totals["bytes_out"],
+        "drops": totals["drops"],
+        "avg_frame_bytes": totals["bytes_in"] // totals["frames_in"] if totals["frames_in"] else 0,
+    }
+
+
+class SessionStats:
+    def __init__(self):
+        self.counter = RollingCounter()
+        self.viewers: Dict[str, RollingCounter] = {}
+
+
+class TrafficStats:
+    """Registry of per-UUID statistics, freed when the session disconnects."""
+
+    def __init__(self):
+        self.sessions: Dict[str, SessionStats] = {}
+
+    def frame_in(self, uuid: str, size: int):
+        session = self.sessions.get(uuid)
+        if session is None:
+            session = self.sessions[uuid] = SessionStats()
+        session.counter.add_frame(FRAMES_IN, size, time.time())
+
+    def frame_dropped(self, uuid: str, viewer: str = None, count: int = 1):
+        """Count drops on ingest (no viewer) or frames a specific viewer never received"""
+        session = self.sessions.get(uuid)
+        if session is None:
+            return
+        now = time.time()
+        session.counter.add(DROPS, count, now)
+        if viewer is not None:
+            viewer_counter = session.viewers.get(viewer)
+            if viewer_counter is not None:
+                viewer_counter.add(DROPS, count, now)
+
+    def frame_out(self, uuid: str, viewer: str, size: int):
+        # Only sessions that have ingested frames are tracked, so a late send
+        # after disconnect can't resurrect a freed entry
+        session = self.sessions.get(uuid)
+        if session is None:
+            return
+        viewer_counter = session.viewers.get(viewer)
+        if viewer_counter is None:
+            viewer_counter = session.viewers[viewer] = RollingCounter()
+        now = time.time()
+        session.counter.add_frame(FRAMES_OUT, size, now)
+        viewer_counter.add_frame(FRAMES_OUT, size, now)
+
+    def remove_viewer(self, uuid: str, viewer: str):
+        session = self.sessions.get(uuid)
+        if session is not None:
+            session.viewers.pop(viewer, None)
+
+    def forget_viewer(self, viewer: str):
+        """Remove a viewer that watched several sessions (e.g. the thumbnail grid)"""
+        for session in self.sessions.values():
+            session.viewers.pop(viewer, None)
+
+    def discard(self, uuid: str):
+        self.sessions.pop(uuid, None)
+
+    def snapshot(self, uuid: str):
+        session = self.sessions.get(uuid)
+        if session is None:
+            return None
+        now = time.time()
+        result = {}
+        for window in WINDOWS:
+            summary = _summarize(session.counter.totals(window, now), window)
+            summary["viewers"] = {}
+            for viewer, counter in session.viewers.items():
+                viewer_summary = _summarize(counter.totals(window, now), window)
+                summary["viewers"][viewer] = {"fps_out": viewer_summary["fps_out"], "drops": viewer_summary["drops"]}
+            result[window] = summary
+        return result
@@ -0,0 +1,215 @@
+"""
+Inter-frame video streaming for live sessions.
+
+Instead of re-encoding every frame as an independent JPEG for every viewer,
+each UUID's stream is encoded once with a software inter-frame codec
+(H.264 or VP8 through PyAV) and the resulting packets are fanned out to all
+viewers that asked for that codec. New or lagging viewers are resynced with
+an on-demand keyframe.
+"""
+import asyncio
+import struct
+from fractions import Fraction
+from typing import Callable, Dict, Optional, Set
+
+try:
+    import av
+except ImportError:  # PyAV is optional - viewers fall back to JPEG without it
+    av = None
+
+# Viewer-facing codec name -> FFmpeg software encoder
+CODECS = {
+    "h264": "libx264",
+    "vp8": "libvpx",
+}
+
+STREAM_FPS = 30
+KEYFRAME_INTERVAL = 300  # Periodic keyframe; joins/resyncs request one explicitly
+SUBSCRIBER_QUEUE_SIZE = 30  # Packets buffered per viewer before it is resynced
+MAX_ENCODER_FAILURES = 3  # Consecutive encode errors before viewers are sent back to JPEG
+
+# Queued to every viewer when the stream's encoder has given up
+FALLBACK = None
+
+# Binary packet sent to viewers: flags (1 byte), sequence (4 bytes), then the
+# raw codec packet (Annex-B for H.264, raw frame for VP8)
+PACKET_HEADER = struct.Struct("!BI")
+FLAG_KEYFRAME = 0x01
+
+
+_codec_checks = {}
+
+
+def codec_available(codec: str) -> bool:
+    """Return True if `codec` can actually be opened and encode a frame on this server"""
+    if av is None or codec not in CODECS:
+        return False
+    if codec not in _codec_checks:
+        try:
+            encoder = InterFrameEncoder(codec)
+            encoder.open(16, 16)
+            encoder.context.encode(av.VideoFrame(16, 16, "yuv420p"))
+            _codec_checks[codec] = True
+        except Exception as e:
+            print(f"[VIDEO] Codec {codec} ({CODECS[codec]}) is not usable: {e}")
+            _codec_checks[codec] = False
+    return _codec_checks[codec]
+
+
+class InterFrameEncoder:
+    """Stateful encoder for a single stream. Runs in a worker thread."""
+
+    def __init__(self, codec: str):
+        self.codec = codec
+        self.context = None
+        self.width = 0
+        self.height = 0
+        self.pts = 0
+        # PyAV >= 12 exposes an enum, older versions take the string name
+        picture_type = getattr(av.video.frame, "PictureType", None)
+        self.keyframe_type = picture_type.I if picture_type is not None else "I"
+
+    def open(self, width: int, height: int):
+        context = av.CodecContext.create(CODECS[self.codec], "w")
+        context.width = width
+        context.height = height
+        context.pix_fmt = "yuv420p"
+        context.time_base = Fraction(1, STREAM_FPS)
+        context.framerate = Fraction(STREAM_FPS, 1)
+        context.gop_size = KEYFRAME_INTERVAL
+        if self.codec == "h264":
+            context.options = {"preset": "ultrafast", "tune": "zerolatency"}
+        else:
+            context.options = {"deadline": "realtime", "cpu-used": "8", "lag-in-frames": "0"}
+        self.context = context
+        self.width = width
+        self.height = height
+        self.pts = 0
+
+    def encode(self, image, force_keyframe: bool = False):
+        """Encode a BGR frame, returning a list of (packet_bytes, is_keyframe)"""
+        height, width = image.shape[:2]
+        # yuv420p needs even dimensions
+        even_width, even_height = width - width % 2, height - height % 2
+        if (even_width, even_height) != (width, height):
+            image = image[:even_height, :even_width].copy()
+
+        if self.context is None or (even_width, even_height) != (self.width, self.height):
+            self.open(even_width, even_height)
+
+        frame = av.VideoFrame.from_ndarray(image, format="bgr24")
+        frame.pts = self.pts
+        self.pts += 1
+        if force_keyframe:
+            frame.pict_type = self.keyframe_type
+
+        return [(bytes(packet), packet.is_keyframe) for packet in self.context.encode(frame)]
+
+
+class VideoStream:
+    """One encoder per (uuid, codec), shared by every viewer of that stream."""
+
+    def __init__(self, uuid: str, codec: str):
+        self.uuid = uuid
+        self.codec = codec
+        self.encoder = InterFrameEncoder(codec)
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.waiting_keyframe: Set[asyncio.Queue] = set()
+        self.drop_handlers: Dict[asyncio.Queue, Callable[[int], None]] = {}
+        self.keyframe_requested = False
+        self.frame_ready = asyncio.Event()
+        self.sequence = 0
+        self.failures = 0
+        self.failed = False
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self, on_drop: Optional[Callable[[int], None]] = None) -> asyncio.Queue:
+        """`on_drop(count)` is called when packets are discarded to resync a lagging viewer"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if on_drop is not None:
+            self.drop_handlers[queue] = on_drop
+        self.waiting_keyframe.add(queue)
+        # Keyframe-on-join: re-encode the current frame so the viewer can start decoding now
+        self.keyframe_requested = True
+        self.frame_ready.set()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        self.waiting_keyframe.discard(queue)
+        self.drop_handlers.pop(queue, None)
+        if not self.subscribers:
+            # Wake the encoder loop so it can exit
+            self.frame_ready.set()
+
+    def notify_frame(self):
+        """Called when a new frame for this UUID lands in latest_frames"""
+        self.frame_ready.set()
+
+    async def run(self, frame_source):
+        """Encode the latest frame whenever one arrives, until all viewers leave.
+
+        Frames that arrive while an encode is in flight are coalesced, so a slow
+        encoder lowers the frame rate instead of building a backlog.
+        """
+        print(f"[VIDEO] {self.codec} encoder started for UUID: {self.uuid}")
+        while self.subscribers:
+            await self.frame_ready.wait()
+            self.frame_ready.clear()
+
+            frame = frame_source()
+            if frame is None or not self.subscribers:
+                continue
+
+            force_keyframe = self.keyframe_requested
+            self.keyframe_requested = False
+            try:
+                packets = await asyncio.to_thread(self.encoder.encode, frame, force_keyframe)
+            except Exception as e:
+                self.failures += 1
+                print(f"[VIDEO] Encoder error for UUID {self.uuid} ({self.failures}/{MAX_ENCODER_FAILURES}): {e}")
+                if self.failures >= MAX_ENCODER_FAILURES:
+                    self._fail()
+                    break
+                self.encoder = InterFrameEncoder(self.codec)
+                self.keyframe_requested = True
+                continue
+
+            self.failures = 0
+            for data, is_keyframe in packets:
+                self._fan_out(data, is_keyframe)
+        print(f"[VIDEO] {self.codec} encoder stopped for UUID: {self.uuid}")
+
+    def _fail(self):
+        """Give up on this encoder and tell every viewer to fall back to JPEG"""
+        self.failed = True
+        for queue in list(self.subscribers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(FALLBACK)
+
+    def _fan_out(self, data: bytes, is_keyframe: bool):
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        message = PACKET_HEADER.pack(FLAG_KEYFRAME if is_keyframe else 0, self.sequence) + data
+
+        for queue in list(self.subscribers):
+            if queue in self.waiting_keyframe:
+                if not is_keyframe:
+                    continue
+                self.waiting_keyframe.discard(queue)
+
+            if queue.full():
+                # Viewer can't keep up: drop its backlog and resync on a keyframe
+                dropped = 1  # The packet that didn't fit
+                while not queue.empty():
+                    queue.get_nowait()
+                    dropped += 1
+                on_drop = self.drop_handlers.get(queue)
+                if on_drop is not None:
+                    on_drop(dropped)
+                self.waiting_keyframe.add(queue)
+                self.keyframe_requested = True
+                continue
+
+            queue.put_nowait(message)